@@ -3,19 +3,69 @@
 # pip install Flask requests
 # 並將其部署到一個雲端伺服器環境中才能運行，例如 Vercel、Heroku 或您自己的伺服器。
 
-from flask import Flask, jsonify, request
+from flask import Flask, request
+from flask.json.provider import JSONProvider
 from flask_cors import CORS # 用於允許前端網頁存取，解決跨域問題
+from flask_compress import Compress # 依瀏覽器的 Accept-Encoding 壓縮回應
 import requests # 用於發送 HTTP 請求到外部 API
-import json # 導入 json 模組用於解析錯誤訊息
-import xml.etree.ElementTree as ET # 用於解析 XML 格式的資料 (例如氣象特報 RSS 和 KML)
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.connection import HTTPConnection
+import redis # 用於快取上游 API 的回應
+import orjson # 以 C/Rust 實作的 JSON 序列化，直接輸出 UTF-8，比 jsonify 快且中文不會被轉成 \uXXXX
+from lxml import etree as ET # 用於解析 XML 格式的資料 (例如氣象特報 RSS 和 KML)，底層為 libxml2 C 函式庫
 import csv # 導入 csv 模組用於解析 CSV 格式的資料
+import numpy as np # 用於向量化解析 KML 座標
 from datetime import datetime
+import logging
 import io # 用於處理字串作為檔案對象
+import os # 用於讀取環境變數設定
+import re # 用於編譯警報特報關鍵字的比對樣式
+import socket
+import time
+import functools
+import itertools
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlencode
+from concurrent.futures import ThreadPoolExecutor # 用於平行發送多個上游請求
+
+# 日誌等級可透過環境變數 LOG_LEVEL 設定 (例如正式環境設為 WARNING)，低於該等級的訊息不會被格式化
+# 無法辨識的等級 (例如 verbose) 改用 INFO，避免 basicConfig 拋出 ValueError 讓整個服務無法啟動
+_requested_log_level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_LEVEL = _requested_log_level if _requested_log_level in logging.getLevelNamesMapping() else 'INFO'
+logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+if LOG_LEVEL != _requested_log_level:
+    logger.warning("無法辨識的 LOG_LEVEL %r，改用 INFO。", _requested_log_level)
+
+# orjson 序列化選項：允許非字串的 dict 鍵，並直接序列化 numpy 陣列
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+class OrjsonProvider(JSONProvider):
+    """讓 Flask 內建的 JSON 處理 (jsonify、路由直接回傳 dict 等) 也改用 orjson。"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app) # 允許所有來源的跨域請求。在實際部署時，為了安全考量，
           # 建議限制只允許您網頁的特定網域存取，例如：CORS(app, resources={r"/*": {"origins": "https://your-website-domain.com"}})
 
+# 壓縮 JSON 回應：欄位名稱重複、座標數字多，壓縮後通常只剩原本的 1/4 到 1/2
+app.config['COMPRESS_MIMETYPES'] = ['application/json']
+app.config['COMPRESS_LEVEL'] = 6
+app.config['COMPRESS_MIN_SIZE'] = 500 # 太小的回應壓縮後幾乎不會變小，不值得花 CPU
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip'] # 瀏覽器支援時優先使用壓縮率較高的 Brotli，否則使用 gzip
+Compress(app)
+
 # 中央氣象署開放資料平台 API Key
 # **請務必將 'CWA-DA27CC49-2356-447C-BDB3-D5AA4071E24B' 替換為您自己申請的真實 API Key！**
 # 這個 Key 同時用於 CWA 的颱風列表 API 和檔案 API。
@@ -27,13 +77,540 @@ CWA_TYPHOON_API_URL = 'https://opendata.cwa.gov.tw/api/v1/rest/datastore/W-C0034
 # 中央氣象署 RSS 警報特報服務 (提供XML格式的最新氣象特報)
 CWA_RSS_WARNING_URL = 'https://www.cwa.gov.tw/rss/Data/cwa_warning.xml'
 
+# 要篩選的警報特報關鍵字，這些關鍵字通常出現在警報特報的標題或描述中
+CWA_WARNING_KEYWORDS = ("警報", "特報", "豪(大)雨特報", "低溫特報", "濃霧特報", "強風特報", "大雷雨", "地震")
+# 將所有關鍵字編譯成單一正規表示式，每個欄位只需掃描一次
+CWA_WARNING_KEYWORD_RE = re.compile('|'.join(re.escape(keyword) for keyword in CWA_WARNING_KEYWORDS))
+# 關鍵字的 UTF-8 位元組，用於在解析 XML 前先掃描整份 RSS
+CWA_WARNING_KEYWORDS_BYTES = tuple(keyword.encode('utf-8') for keyword in CWA_WARNING_KEYWORDS)
+# 確認回應看起來是 RSS 的標記；沒有這些標記時 (維護頁面、WAF 頁面等) 必須完整解析，讓錯誤浮現
+RSS_MARKERS_BYTES = (b'<rss', b'<channel')
+# 讀取 XML 宣告中的編碼名稱
+XML_DECLARED_ENCODING_RE = re.compile(rb'\s*<\?xml[^>]*?encoding\s*=\s*["\']([A-Za-z0-9._-]+)')
+# 預先編譯的 XPath，一次取出 <item> 底下需要的四個子元素，取代四次 find()
+CWA_RSS_ITEM_FIELDS_XPATH = ET.XPath('title|link|description|pubDate')
+
 # *** 修正點：直接從您 GitHub 倉庫中獲取 KML 檔案的 URL ***
 # 請將 'st107085' 替換為您的 GitHub 帳號，'typhoon-info-hub' 替換為您的倉庫名稱
 # 假設 KML 檔案將由 GitHub Actions 儲存在倉庫的 'data/' 目錄下，並命名為 'typhoon_track.kml'
 NSTC_OPENDATA_KML_URL = "https://raw.githubusercontent.com/st107085/typhoon-info-hub/main/data/typhoon_track.kml"
 
+# KML 命名空間
+KML_NAMESPACE = 'http://www.opengis.net/kml/2.2'
+# 預先組好的 Clark 標記法標籤名稱，find() 時直接比對，不需要每次透過前綴對照表解析 'kml:' 前綴
+KML_PLACEMARK_TAG = f'{{{KML_NAMESPACE}}}Placemark'
+KML_NAME_TAG = f'{{{KML_NAMESPACE}}}name'
+KML_LINESTRING_TAG = f'{{{KML_NAMESPACE}}}LineString'
+KML_COORDINATES_TAG = f'{{{KML_NAMESPACE}}}coordinates'
+# 路徑座標保留的小數位數：4 位約為 11 公尺，對地圖繪製已足夠，且 JSON 中的數字較短 (121.3456 而非 121.34561999999999)
+KML_COORDINATE_DECIMALS = 4
+
+# 上游請求逾時設定 (連線逾時, 讀取逾時)，單位為秒；所有上游請求都使用這個設定，避免 worker 無限期等待
+UPSTREAM_TIMEOUT = (3.05, 10)
+
+# 連線池中的連線啟用 TCP keepalive：閒置 60 秒後開始探測，避免連線被中間設備悄悄斷開後才在下次請求時發現
+UPSTREAM_KEEPALIVE_SOCKET_OPTIONS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+if hasattr(socket, 'TCP_KEEPIDLE'): # Linux
+    UPSTREAM_KEEPALIVE_SOCKET_OPTIONS += [
+        (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60),
+        (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10),
+        (socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3),
+    ]
+
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    """在連線池的 socket 上設定 TCP keepalive 的 HTTPAdapter。"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = HTTPConnection.default_socket_options + UPSTREAM_KEEPALIVE_SOCKET_OPTIONS
+        super().init_poolmanager(*args, **kwargs)
+
+
+# 共用的 HTTP Session：重複使用到上游主機的 TCP/TLS 連線，避免每次請求都重新握手
+# 以 gevent 執行時，每個主機的連線池大小應不小於 worker_connections (見 gunicorn.conf.py)
+UPSTREAM_POOL_MAXSIZE = int(os.environ.get('UPSTREAM_POOL_MAXSIZE', '32'))
+SESSION = requests.Session()
+UPSTREAM_ADAPTER = KeepAliveHTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=UPSTREAM_POOL_MAXSIZE,
+    # 讀取逾時不重試 (read=0)：否則單次請求最久可達 UPSTREAM_TIMEOUT 的數倍，連線錯誤與 502/503/504 仍會重試。
+    # 重試前不依上游的 Retry-After 等待 (該值沒有上限，可能讓請求卡住數分鐘)，只使用 backoff_factor 的短暫退避
+    max_retries=Retry(total=3, read=0, backoff_factor=0.2, status_forcelist=[502, 503, 504], respect_retry_after_header=False),
+)
+# http:// 與 https:// 共用同一個 adapter，改用 http 的上游 URL 也有相同的連線池、keepalive 與重試設定
+SESSION.mount('https://', UPSTREAM_ADAPTER)
+SESSION.mount('http://', UPSTREAM_ADAPTER)
+SESSION.headers.update({
+    'User-Agent': 'typhoon-proxy-server',
+    # RSS、KML 與 JSON 都是文字資料，壓縮後傳輸量可減少數倍；requests 會自動解壓縮 (br 需要 requirements.txt 中的 brotli)
+    'Accept-Encoding': 'gzip, deflate, br',
+})
+# 串流下載 KML 時每次交給解析器的位元組數
+KML_CHUNK_SIZE = 64 * 1024
+
+# 斷路器：同一個上游主機連續失敗 UPSTREAM_BREAKER_FAIL_MAX 次後，暫停呼叫 UPSTREAM_BREAKER_RESET_TIMEOUT 秒。
+# 暫停期間請求不會再排隊等待逾時，而是立即失敗，並由 cached 裝飾器改回傳 Redis 中的舊資料
+UPSTREAM_BREAKER_FAIL_MAX = 5
+UPSTREAM_BREAKER_RESET_TIMEOUT = 30
+UPSTREAM_BREAKERS = {} # {上游主機: UpstreamBreaker}
+UPSTREAM_BREAKERS_LOCK = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中 (或半開狀態已有試探請求進行中)，未發送請求。"""
+
+
+class UpstreamBreaker:
+    """
+    單一上游主機的斷路器。鎖只保護狀態的檢查與更新，上游請求本身在鎖外執行，
+    同一主機的請求可以同時進行，斷路器開啟時其他請求也不會排隊等待，而是立即失敗。
+    - closed：正常呼叫，連續失敗 fail_max 次後轉為 open。
+    - open：reset_timeout 秒內一律拋出 CircuitOpenError；之後轉為 half-open。
+    - half-open：只放行一個試探請求，成功則回到 closed，失敗則重新 open；試探期間其他請求立即失敗。
+    """
+
+    def __init__(self, name, fail_max, reset_timeout):
+        self.name = name
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None # 轉為 open 的時間，closed 時為 None
+        self._trial_in_flight = False
+
+    @property
+    def current_state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._trial_in_flight or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self):
+        """檢查是否可以發送請求，不可以時拋出 CircuitOpenError；回傳此請求是否為半開狀態的試探請求。"""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if self._trial_in_flight or time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"{self.name} 斷路器開啟中")
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self, trial):
+        with self._lock:
+            if trial or self._opened_at is None:
+                self._failures = 0
+                self._opened_at = None
+            if trial:
+                self._trial_in_flight = False
+
+    def record_failure(self, trial):
+        with self._lock:
+            opened = trial or (self._opened_at is None and self._failures + 1 >= self.fail_max)
+            if trial:
+                self._trial_in_flight = False
+            elif self._opened_at is None:
+                self._failures += 1
+            if opened:
+                self._opened_at = time.monotonic()
+        if opened:
+            logger.warning("上游 %s 請求失敗，斷路器開啟 %d 秒。", self.name, self.reset_timeout)
+
+
+def _is_client_error(e):
+    """4xx 表示上游仍正常回應 (例如 KML 尚未產生時的 404)，不計入斷路器的失敗次數。"""
+    return isinstance(e, requests.exceptions.HTTPError) and e.response is not None and e.response.status_code < 500
+
+
+def _upstream_breaker(url):
+    """取得 URL 所屬上游主機的斷路器，第一次使用時建立。"""
+    host = urlsplit(url).netloc
+    with UPSTREAM_BREAKERS_LOCK:
+        breaker = UPSTREAM_BREAKERS.get(host)
+        if breaker is None:
+            breaker = UPSTREAM_BREAKERS[host] = UpstreamBreaker(
+                host,
+                fail_max=UPSTREAM_BREAKER_FAIL_MAX,
+                reset_timeout=UPSTREAM_BREAKER_RESET_TIMEOUT,
+            )
+        return breaker
+
+
+def _get_checked(url, **kwargs):
+    """發送 GET 請求，HTTP 錯誤狀態 (304 除外) 時關閉連線並拋出 HTTPError。"""
+    response = SESSION.get(url, timeout=UPSTREAM_TIMEOUT, **kwargs)
+    if response.status_code != 304:
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+    return response
+
+
+def fetch_upstream(url, **kwargs):
+    """
+    透過共用 SESSION 與上游主機的斷路器發送 GET 請求，並自動帶上條件式請求標頭與逾時設定。
+    HTTP 錯誤狀態 (304 除外) 會拋出 HTTPError；斷路器開啟期間直接拋出 CircuitOpenError，不會發送請求。
+    """
+    breaker = _upstream_breaker(url)
+    trial = breaker.before_call()
+    try:
+        response = _get_checked(url, headers=_conditional_headers(url), **kwargs)
+    except Exception as e:
+        if _is_client_error(e):
+            breaker.record_success(trial)
+        else:
+            breaker.record_failure(trial)
+        raise
+    breaker.record_success(trial)
+    return response
+
+# 上游回應的驗證資訊與解析結果：{url: (etag, last_modified, result)}
+# 下次請求同一個 URL 時帶上 If-None-Match / If-Modified-Since，上游回應 304 時直接沿用解析結果
+UPSTREAM_VALIDATORS = {}
+
+
+def _conditional_headers(url):
+    """依先前記錄的 ETag / Last-Modified 產生條件式請求標頭。"""
+    entry = UPSTREAM_VALIDATORS.get(url)
+    if entry is None:
+        return {}
+    etag, last_modified, _ = entry
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+def _remember_upstream_result(url, response, result):
+    """記錄上游回應的 ETag / Last-Modified 與其解析結果；上游未提供任何驗證資訊時不記錄。"""
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if etag or last_modified:
+        UPSTREAM_VALIDATORS[url] = (etag, last_modified, result)
+
+
+def _cached_upstream_result(url):
+    """取得上游回應 304 時要沿用的解析結果。"""
+    return UPSTREAM_VALIDATORS[url][2]
+
+
+# 已解析的 KML 路徑，以上游 ETag (沒有時改用內容的 SHA-256) 為鍵，只保留最近幾份
+PARSED_KML_CACHE = OrderedDict()
+PARSED_KML_CACHE_MAXSIZE = 8
+PARSED_KML_CACHE_LOCK = threading.Lock()
+
+
+def _parsed_kml_get(key):
+    """從已解析 KML 快取取出路徑列表，不存在時回傳 None。"""
+    with PARSED_KML_CACHE_LOCK:
+        typhoon_paths = PARSED_KML_CACHE.get(key)
+        if typhoon_paths is not None:
+            PARSED_KML_CACHE.move_to_end(key)
+        return typhoon_paths
+
+
+def _parsed_kml_put(key, typhoon_paths):
+    """將解析結果放入已解析 KML 快取，超過容量時移除最久未使用的項目。"""
+    with PARSED_KML_CACHE_LOCK:
+        PARSED_KML_CACHE[key] = typhoon_paths
+        PARSED_KML_CACHE.move_to_end(key)
+        while len(PARSED_KML_CACHE) > PARSED_KML_CACHE_MAXSIZE:
+            PARSED_KML_CACHE.popitem(last=False)
+
+
+# 所有 lxml 解析器共用的安全設定：不解析外部實體、不連網，避免 XXE 等 XML 攻擊。
+# collect_ids=False：不建立 xml:id 雜湊表，RSS 與 KML 都用不到 ID 查詢。
+# lxml 的解析器物件不能在多個執行緒間同時使用，因此每次解析都以這組設定建立新的解析器。
+SAFE_XML_PARSER_OPTIONS = {
+    'resolve_entities': False,
+    'no_network': True,
+    'huge_tree': False,
+    'collect_ids': False,
+}
+
+# Redis 快取設定
+# 請透過環境變數 REDIS_URL 指定 Redis 連線位址，例如：redis://:password@your-redis-host:6379/0
+# 未設定時不使用 Redis (redis_client 為 None)，只使用行程內的 L1 快取
+REDIS_URL = os.environ.get('REDIS_URL')
+redis_client = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=1, socket_timeout=1) if REDIS_URL else None
+# Redis 讀寫失敗後暫停使用 Redis 的秒數，期間只使用 L1 快取，請求不必每次都等待連線逾時
+REDIS_RETRY_SECONDS = 5
+_redis_retry_at = 0.0 # 可以再次嘗試 Redis 的時間 (time.monotonic())
+
+# 快取策略：各端點回應被視為「新鮮」的秒數
+CACHE_POLICIES = {
+    'short': 60,   # 颱風資料
+    'normal': 120, # 警報特報
+    'long': 300,   # 國際颱風路徑 (KML 由 GitHub Actions 定期更新)
+}
+# 快取過期後在 Redis 中額外保留的秒數，上游失敗時用這段期間內的舊資料作為備援
+CACHE_STALE_BUFFER = 600
+# 最後一次成功回應 (last-known-good) 的保留秒數；舊快取也過期後，上游失敗時仍可用這份資料備援
+CACHE_LKG_SECONDS = 24 * 60 * 60
+# 設為 0 / false 可停用上游失敗時改回傳舊資料的備援機制
+CACHE_FALLBACK_ENABLED = os.environ.get('CACHE_FALLBACK_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+# 行程內的 L1 快取：{快取鍵: (L1 到期時間, 快取項目)}，放在 Redis 前面，
+# 短時間內重複的請求 (例如多個分頁同時輪詢) 不需要往返 Redis；同一進程內的所有執行緒/協程共用。
+# 項目超過 L1 到期時間後仍保留到舊資料緩衝期結束，Redis 沒有資料或無法連線時，以此判斷新鮮度並作為上游失敗時的備援
+L1_CACHE = OrderedDict()
+L1_CACHE_MAXSIZE = 32
+L1_CACHE_SECONDS = 10
+L1_CACHE_LOCK = threading.Lock()
+# 瀏覽器可以直接使用本地快取、不重新驗證的秒數
+CLIENT_CACHE_MAX_AGE = 30
+
+
+def json_response(obj, status=200):
+    """以 orjson 序列化物件並包成 JSON 回應，取代 jsonify。"""
+    return app.response_class(orjson.dumps(obj, option=ORJSON_OPTIONS), status=status, mimetype='application/json')
+
+
+def _l1_get(key, include_expired=False):
+    """
+    從 L1 快取取出仍未到期的快取項目，不存在或已到期時回傳 None。
+    include_expired=True 時，超過 L1 到期時間但仍在舊資料緩衝期內的項目也會回傳。
+    """
+    now = time.time()
+    with L1_CACHE_LOCK:
+        item = L1_CACHE.get(key)
+        if item is None:
+            return None
+        expires_at, entry = item
+        if now >= float(entry[b'stale_at']) + CACHE_STALE_BUFFER:
+            del L1_CACHE[key]
+            return None
+        if now >= expires_at and not include_expired:
+            return None
+        L1_CACHE.move_to_end(key)
+        return entry
+
+
+def _l1_put(key, entry):
+    """將快取項目放入 L1 快取，最多保留 L1_CACHE_SECONDS 秒且不超過其新鮮期限；超過容量時移除最久未使用的項目。"""
+    expires_at = min(time.time() + L1_CACHE_SECONDS, float(entry[b'stale_at']))
+    with L1_CACHE_LOCK:
+        L1_CACHE[key] = (expires_at, entry)
+        L1_CACHE.move_to_end(key)
+        while len(L1_CACHE) > L1_CACHE_MAXSIZE:
+            L1_CACHE.popitem(last=False)
+
+
+def _redis_available():
+    """是否有設定 Redis，且不在上次失敗後的暫停期間內。"""
+    return redis_client is not None and time.monotonic() >= _redis_retry_at
+
+
+def _redis_failed(action, key, e):
+    """記錄 Redis 讀寫失敗，並在 REDIS_RETRY_SECONDS 秒內不再嘗試 Redis。"""
+    global _redis_retry_at
+    _redis_retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+    logger.warning("%s Redis 快取失敗 (%s)，%d 秒內只使用 L1 快取: %s", action, key, REDIS_RETRY_SECONDS, e)
+
+
+def _cache_load(key):
+    """從 Redis 讀取快取項目，不存在、未設定 Redis 或 Redis 無法連線時回傳 None。"""
+    if not _redis_available():
+        return None
+    try:
+        entry = redis_client.hgetall(key)
+    except redis.exceptions.RedisError as e:
+        _redis_failed("讀取", key, e)
+        return None
+    return entry or None
+
+
+def _lkg_key(key):
+    """快取鍵對應的 last-known-good 鍵。"""
+    return f"lkg:{key}"
+
+
+def _cache_store(key, response, ttl):
+    """
+    將成功的回應寫入 L1 快取與 Redis hash，Redis 的過期時間為 ttl 加上舊資料緩衝時間。
+    同一份回應也寫入 last-known-good 鍵，保留 CACHE_LKG_SECONDS 秒；未設定 Redis 時只寫入 L1 快取。
+    """
+    now = time.time()
+    # 欄位名稱使用位元組，與從 Redis 讀回的 hash 格式相同，L1 快取可以直接沿用
+    mapping = {
+        b'body': response.get_data(),
+        b'status': response.status_code,
+        b'content_type': response.content_type.encode(),
+        b'generated_at': now,
+        b'stale_at': now + ttl,
+    }
+    _l1_put(key, mapping)
+    if not _redis_available():
+        return
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, ttl + CACHE_STALE_BUFFER)
+        pipe.hset(_lkg_key(key), mapping=mapping)
+        pipe.expire(_lkg_key(key), CACHE_LKG_SECONDS)
+        pipe.execute()
+    except redis.exceptions.RedisError as e:
+        _redis_failed("寫入", key, e)
+
+
+def _response_from_cache(entry):
+    """將 Redis hash 還原為 Flask 回應物件，Last-Modified 為該快取項目產生的時間。"""
+    response = app.response_class(
+        entry[b'body'],
+        status=int(entry[b'status']),
+        content_type=entry[b'content_type'].decode(),
+    )
+    response.last_modified = float(entry[b'generated_at'])
+    return response
+
+
+def _cache_key(query_params=()):
+    """
+    目前請求的快取鍵：路由路徑加上排序後、處理函式實際會讀取的查詢參數 (query_params)。
+    其他查詢參數 (例如隨機的 ?x=) 不會產生新的快取項目，避免繞過快取打到上游或讓 Redis 無限制成長。
+    """
+    params = sorted((name, value) for name, value in request.args.items(multi=True) if name in query_params)
+    if not params:
+        return f"cwa:{request.path}"
+    return f"cwa:{request.path}?{urlencode(params)}"
+
+
+# 正在向上游取得資料的快取鍵：{快取鍵: _InflightCall}，同一個鍵同時只有一個請求 (leader) 呼叫處理函式
+INFLIGHT = {}
+INFLIGHT_LOCK = threading.Lock()
+# 其他請求等待 leader 完成的最長秒數，超過時自行呼叫處理函式
+SINGLE_FLIGHT_WAIT_SECONDS = 30
+
+
+class _InflightCall:
+    """leader 的執行狀態；完成後 result 為其回應的 (內容, 狀態碼, 標頭)，leader 拋出例外時維持 None。"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+    def publish(self, response):
+        self.result = (response.get_data(), response.status_code, list(response.headers.items()))
+
+    def response(self):
+        """以 leader 的回應內容建立一個新的回應物件 (回應物件不在請求之間共用)。"""
+        body, status, headers = self.result
+        return app.response_class(body, status=status, headers=headers)
+
+
+def _is_cacheable(response):
+    """
+    只有成功的回應才寫入快取 (以及 last-known-good 鍵)。處理函式對 HTTP 200 但不代表成功的回應
+    (例如 KML 中沒有任何颱風路徑) 設定 Cache-Control: no-store，避免蓋掉上一份正確的資料。
+    """
+    return response.status_code == 200 and 'no-store' not in response.headers.get('Cache-Control', '')
+
+
+def _hit_response(entry):
+    """將新鮮的快取項目還原為回應，並加上 X-Cache: HIT 標頭。"""
+    response = _response_from_cache(entry)
+    response.headers['X-Cache'] = 'HIT'
+    return response
+
+
+def cached(ttl=None, policy='normal', query_params=()):
+    """
+    以 Redis 快取路由回應的裝飾器，快取鍵由路由路徑與 query_params 列出的查詢參數組成 (見 _cache_key)；
+    處理函式會讀取的查詢參數都必須列在 query_params 中，否則不同參數的回應會共用同一筆快取。
+    Redis 前面還有一層短效的行程內 L1 快取 (見 _l1_get)。
+    - 快取仍新鮮時直接回傳快取內容 (X-Cache: HIT)，不向上游發送請求。
+    - 快取過期或不存在時呼叫原本的處理函式 (X-Cache: MISS)，只有 HTTP 200 且未設定 no-store 的回應才會寫入快取。
+    - 處理函式回傳 5xx (上游失敗或斷路器開啟) 時，若 Redis 中仍有舊資料 (或 last-known-good 資料)，
+      則改回傳舊資料並加上 X-Cache: STALE 標頭；CACHE_FALLBACK_ENABLED 為 False 時不備援。
+    - 同一個快取鍵同時有多個請求未命中時 (例如快取剛過期)，只有第一個請求呼叫處理函式，
+      其他請求等待它完成後直接使用它的回應 (single-flight)，上游失敗時也一樣，上游不會同時收到大量相同的請求。
+    未設定 Redis 或 Redis 無法連線時只使用行程內的 L1 快取，L1 也沒有資料時直接呼叫原本的處理函式。
+    """
+    fresh_seconds = ttl if ttl is not None else CACHE_POLICIES[policy]
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = _cache_key(query_params)
+            entry = _l1_get(key)
+            if entry is None:
+                entry = _cache_load(key)
+                if entry is None:
+                    # Redis 沒有資料或無法連線時，改用 L1 中保留的項目 (仍依其 stale_at 判斷是否新鮮)
+                    entry = _l1_get(key, include_expired=True)
+                if entry is not None and time.time() < float(entry[b'stale_at']):
+                    _l1_put(key, entry) # 重新放入 L1，接下來 L1_CACHE_SECONDS 秒內不必再查詢 Redis
+            if entry is not None and time.time() < float(entry[b'stale_at']):
+                return _hit_response(entry)
+
+            with INFLIGHT_LOCK:
+                call = INFLIGHT.get(key)
+                is_leader = call is None
+                if is_leader:
+                    call = INFLIGHT[key] = _InflightCall()
+            if not is_leader:
+                # 等待 leader 完成並直接沿用它的回應 (包含上游失敗時的 5xx 或 STALE)，不再自行向上游請求；
+                # 只有等待逾時或 leader 拋出例外時才自行呼叫處理函式
+                if call.done.wait(SINGLE_FLIGHT_WAIT_SECONDS) and call.result is not None:
+                    return call.response()
+                return render(key, entry, *args, **kwargs)
+
+            try:
+                response = render(key, entry, *args, **kwargs)
+                call.publish(response)
+                return response
+            finally:
+                with INFLIGHT_LOCK:
+                    del INFLIGHT[key]
+                call.done.set()
+
+        def render(key, entry, *args, **kwargs):
+            """呼叫原本的處理函式並寫入快取；上游失敗時改回傳舊資料。"""
+            response = app.make_response(view(*args, **kwargs))
+            if _is_cacheable(response):
+                response.last_modified = time.time()
+                _cache_store(key, response, fresh_seconds)
+            elif response.status_code >= 500 and CACHE_FALLBACK_ENABLED:
+                fallback = entry if entry is not None else _cache_load(_lkg_key(key))
+                if fallback is not None:
+                    logger.warning("上游請求失敗，改用 %s 的舊快取資料。", key)
+                    stale_response = _response_from_cache(fallback)
+                    stale_response.headers['X-Cache'] = 'STALE'
+                    return stale_response
+            response.headers['X-Cache'] = 'MISS'
+            return response
+
+        wrapper.cache_ttl = fresh_seconds # 供背景更新 (refresh_route) 寫入快取時使用
+        wrapper.cache_query_params = query_params
+        return wrapper
+    return decorator
+
+
+@app.after_request
+def add_client_cache_headers(response):
+    """
+    為成功的 JSON 回應加上 ETag (內容的 BLAKE2b 雜湊) 與 Cache-Control 標頭。
+    瀏覽器輪詢時帶上 If-None-Match (或 If-Modified-Since)，內容未變更就回傳不含內容的 304。
+    ETag 為弱驗證碼：壓縮前後的內容語意相同，flask-compress 不會再為壓縮格式改寫 ETag，
+    因此同一個 ETag 在壓縮與未壓縮的回應都能比對成功。
+    處理函式已自行設定 Cache-Control 的回應 (例如 /healthz 的 no-store) 維持原樣。
+    """
+    if request.method != 'GET' or response.status_code != 200 or response.mimetype != 'application/json':
+        return response
+    if 'Cache-Control' in response.headers:
+        return response
+    response.set_etag(hashlib.blake2b(response.get_data(), digest_size=12).hexdigest(), weak=True)
+    response.headers['Cache-Control'] = f'public, max-age={CLIENT_CACHE_MAX_AGE}'
+    return response.make_conditional(request)
+
 
 @app.route('/get-typhoon-data', methods=['GET'])
+@cached(policy='short')
 def get_typhoon_data():
     """
     這個路由會作為前端網頁的代理，去中央氣象署 API 獲取颱風資料。
@@ -42,216 +619,472 @@ def get_typhoon_data():
     """
     try:
         # 向中央氣象署 API 發送請求，並在 URL 中包含 Authorization 參數 (API Key)
-        api_response = requests.get(f"{CWA_TYPHOON_API_URL}?Authorization={CWA_API_KEY}")
-        api_response.raise_for_status() # 如果響應狀態碼不是 200 (表示成功)，則拋出 HTTPError 異常
+        typhoon_url = f"{CWA_TYPHOON_API_URL}?Authorization={CWA_API_KEY}"
+        # 如果響應狀態碼不是 200 (表示成功) 或 304，fetch_upstream 會拋出 HTTPError 異常
+        api_response = fetch_upstream(typhoon_url)
+        if api_response.status_code == 304: # 資料未變更，沿用上次的結果
+            body = _cached_upstream_result(typhoon_url)
+        else:
+            body = api_response.content
+            # 這個路由只是單純轉送資料，上游標示為 JSON 時直接轉送原始位元組，不需要解析再重新序列化。
+            # 只有在 Content-Type 不是 JSON 時才以 orjson 驗證，如果回應不是有效的 JSON，會拋出 orjson.JSONDecodeError。
+            if not api_response.headers.get('Content-Type', '').startswith('application/json'):
+                orjson.loads(body)
+            _remember_upstream_result(typhoon_url, api_response, body)
 
-        # 嘗試解析 API 回應為 JSON 格式。如果回應不是有效的 JSON，會拋出 ValueError。
-        data = api_response.json()
-        return jsonify(data) # 將從氣象署獲取的 JSON 資料直接返回給前端
+        # 將從氣象署獲取的 JSON 資料直接返回給前端
+        return app.response_class(body, status=200, mimetype='application/json')
 
+    except CircuitOpenError as e:
+        # 中央氣象署 API 連續失敗，斷路器開啟中，暫時不發送請求
+        logger.warning("中央氣象署 API 斷路器開啟中，暫停請求: %s", e)
+        return json_response({"error": "中央氣象署 API 暫時無法使用，請稍後再試", "details": str(e)}, 503)
     except requests.exceptions.RequestException as e:
         # 處理網路請求錯誤（例如連線失敗、DNS 解析失敗、超時等）
-        print(f"向中央氣象署 API 請求失敗: {e}")
+        logger.error("向中央氣象署 API 請求失敗: %s", e)
         # 嘗試獲取中央氣象署 API 的回應狀態碼和內容，以便偵錯
-        cwa_response_status = api_response.status_code if 'api_response' in locals() and api_response else None
-        cwa_response_text = api_response.text if 'api_response' in locals() and api_response else None
+        cwa_response_status = e.response.status_code if e.response is not None else None
+        cwa_response_text = e.response.text if e.response is not None else None
         
-        return jsonify({
+        return json_response({
             "error": "無法從中央氣象署獲取颱風資料",
             "details": str(e), # 錯誤的詳細訊息
             "cwa_response_status": cwa_response_status, # 中央氣象署 API 的 HTTP 狀態碼
             "cwa_response_text": cwa_response_text # 中央氣象署 API 的原始回應內容
-        }), 500 # 返回 HTTP 500 內部伺服器錯誤狀態碼
-    except json.JSONDecodeError as e: # 捕獲 JSON 解析錯誤
-        print(f"解析中央氣象署 API 回應失敗 (非 JSON 格式): {e}")
+        }, 500) # 返回 HTTP 500 內部伺服器錯誤狀態碼
+    except orjson.JSONDecodeError as e: # 捕獲 JSON 解析錯誤 (orjson.JSONDecodeError 是 json.JSONDecodeError 的子類別)
+        logger.error("解析中央氣象署 API 回應失敗 (非 JSON 格式): %s", e)
         # 同樣嘗試獲取中央氣象署 API 的回應狀態碼和內容
         cwa_response_status = api_response.status_code if 'api_response' in locals() and api_response else None
         cwa_response_text = api_response.text if 'api_response' in locals() and api_response else None
-        return jsonify({
+        return json_response({
             "error": "解析中央氣象署 API 回應失敗 (非 JSON 格式)",
             "details": str(e),
             "cwa_response_status": cwa_response_status,
             "cwa_response_text": cwa_response_text
-        }), 500
+        }, 500)
     except Exception as e:
         # 處理其他所有未預期的錯誤
-        print(f"伺服器代理獲取颱風資料時發生未知錯誤: {e}")
-        return jsonify({"error": "伺服器內部錯誤", "details": str(e)}), 500
+        logger.exception("伺服器代理獲取颱風資料時發生未知錯誤: %s", e)
+        return json_response({"error": "伺服器內部錯誤", "details": str(e)}, 500)
+
+def _rss_may_contain_keywords(rss_bytes):
+    """
+    以位元組比對快速判斷 RSS 是否可能包含任何關鍵字，回傳 False 時可以不必解析 XML。
+    只有看起來是 RSS (含 <rss 或 <channel)、UTF-8 且不含字元參照 (&#...;) 的內容才能以位元組判斷，
+    其他情況一律回傳 True；否則非 RSS 的 200 回應會被當成「沒有警報」寫入快取，蓋掉上一份正確資料。
+    """
+    if not any(marker in rss_bytes for marker in RSS_MARKERS_BYTES):
+        return True
+    if rss_bytes.startswith((b'\xff\xfe', b'\xfe\xff')): # UTF-16 BOM
+        return True
+    declaration = XML_DECLARED_ENCODING_RE.match(rss_bytes)
+    if declaration is not None and declaration.group(1).lower() not in (b'utf-8', b'utf8'):
+        return True
+    if b'&#' in rss_bytes:
+        return True
+    return any(keyword in rss_bytes for keyword in CWA_WARNING_KEYWORDS_BYTES)
+
+
+def parse_cwa_warnings(rss_bytes):
+    """
+    解析中央氣象署 RSS 的 XML 內容，篩選出標題或描述包含警報特報關鍵字的項目。
+    整份 RSS 都沒有出現任何關鍵字時 (沒有生效中的警報特報，最常見的情況) 直接回傳空列表，不解析 XML；
+    內容不像 RSS 時仍會完整解析，格式錯誤會拋出例外。
+    以 iterparse 逐一處理 <item>，處理完立即釋放，記憶體中不保留整棵 XML 樹。
+    """
+    if not _rss_may_contain_keywords(rss_bytes):
+        return []
+
+    warnings = [] # 用於儲存篩選後的警報特報資訊
+
+    # 遍歷 RSS feed 中的每個 <item> 標籤 (只在 </item> 時取得事件，此時其子元素已解析完成)
+    for _, item in ET.iterparse(io.BytesIO(rss_bytes), events=('end',), tag='item', **SAFE_XML_PARSER_OPTIONS):
+        # 安全地獲取每個元素的文本內容，如果元素不存在或沒有文字則設為空字串；重複的子元素只取第一個 (與 find() 相同)
+        fields = {}
+        for element in CWA_RSS_ITEM_FIELDS_XPATH(item):
+            fields.setdefault(element.tag, element.text or '')
+        title = fields.get('title', '')
+        link = fields.get('link', '')
+        description = fields.get('description', '')
+        pubDate = fields.get('pubDate', '')
+
+        # 檢查標題或描述是否包含任何關鍵字，只要找到一個關鍵字就停止檢查
+        if CWA_WARNING_KEYWORD_RE.search(title) or CWA_WARNING_KEYWORD_RE.search(description): # 如果包含相關關鍵字，則將其加入到 warnings 列表中
+            warnings.append({
+                "title": title,
+                "link": link,
+                "description": description,
+                "pubDate": pubDate
+            })
+        # 釋放已處理的 <item> 以及之前的兄弟節點 (包含 channel 本身的 title、link 等)，只保留目前這一個項目
+        item.clear()
+        while item.getprevious() is not None:
+            del item.getparent()[0]
+    return warnings
+
 
 @app.route('/get-cwa-warnings', methods=['GET'])
+@cached(policy='normal')
 def get_cwa_warnings():
     """
     這個路由會作為前端網頁的代理，去中央氣象署 RSS 服務獲取警報特報資料。
     它會獲取 XML 格式的 RSS feed，解析其中的項目，並篩選出與警報特報相關的資訊，
     然後以 JSON 格式返回給前端。
     """
-    print("Received request for /get-cwa-warnings") # 輸出訊息到伺服器控制台，確認請求是否到達代理伺服器
+    logger.debug("Received request for /get-cwa-warnings") # 確認請求是否到達代理伺服器 (需將日誌等級設為 DEBUG)
     try:
-        rss_response = requests.get(CWA_RSS_WARNING_URL)
-        rss_response.raise_for_status() # 如果響應狀態碼不是 200，則拋出 HTTPError
+        rss_response = fetch_upstream(CWA_RSS_WARNING_URL) # 如果響應狀態碼不是 200 或 304，則拋出 HTTPError
+        if rss_response.status_code == 304: # RSS 未變更，沿用上次篩選的結果
+            warnings = _cached_upstream_result(CWA_RSS_WARNING_URL)
+        else:
+            warnings = parse_cwa_warnings(rss_response.content) # 使用 .content 獲取原始位元組，lxml 會依 XML 宣告處理編碼
+            _remember_upstream_result(CWA_RSS_WARNING_URL, rss_response, warnings)
 
-        # 解析 XML 格式的 RSS 回應
-        root = ET.fromstring(rss_response.content) # 使用 .content 獲取原始位元組，ET.fromstring 可以處理
-        
-        warnings = [] # 用於儲存篩選後的警報特報資訊
-        
-        # 定義要篩選的關鍵字，這些關鍵字通常出現在警報特報的標題或描述中
-        keywords_to_filter = ["警報", "特報", "豪(大)雨特報", "低溫特報", "濃霧特報", "強風特報", "大雷雨", "地震"]
-
-        # 遍歷 RSS feed 中的每個 <item> 標籤
-        for item in root.findall('.//item'):
-            # 安全地獲取每個元素的文本內容，如果元素不存在則設為空字串
-            title = item.find('title').text if item.find('title') is not None else ''
-            link = item.find('link').text if item.find('link') is not None else ''
-            description = item.find('description').text if item.find('description') is not None else ''
-            pubDate = item.find('pubDate').text if item.find('pubDate') is not None else ''
-
-            # 檢查標題或描述是否包含任何關鍵字
-            is_relevant = False
-            for keyword in keywords_to_filter:
-                if keyword in title or keyword in description:
-                    is_relevant = True
-                    break # 只要找到一個關鍵字就停止檢查
-            
-            if is_relevant: # 如果包含相關關鍵字，則將其加入到 warnings 列表中
-                warnings.append({
-                    "title": title,
-                    "link": link,
-                    "description": description,
-                    "pubDate": pubDate
-                })
-        
-        return jsonify({"success": True, "warnings": warnings}) # 返回成功的 JSON 回應和篩選後的警報列表
+        return json_response({"success": True, "warnings": warnings}) # 返回成功的 JSON 回應和篩選後的警報列表
 
+    except CircuitOpenError as e:
+        logger.warning("中央氣象署 RSS 斷路器開啟中，暫停請求: %s", e)
+        return json_response({"error": "中央氣象署 RSS 暫時無法使用，請稍後再試", "details": str(e)}, 503)
     except requests.exceptions.RequestException as e:
-        print(f"向中央氣象署 RSS 請求失敗: {e}")
-        return jsonify({"error": "無法從中央氣象署 RSS 獲取資料", "details": str(e)}), 500
-    except ET.ParseError as e: # 捕獲 XML 解析錯誤
-        print(f"解析 RSS XML 失敗: {e}")
-        return jsonify({"error": "解析 RSS XML 失敗", "details": str(e)}), 500
+        logger.error("向中央氣象署 RSS 請求失敗: %s", e)
+        return json_response({"error": "無法從中央氣象署 RSS 獲取資料", "details": str(e)}, 500)
+    except ET.XMLSyntaxError as e: # 捕獲 XML 解析錯誤
+        logger.error("解析 RSS XML 失敗: %s", e)
+        return json_response({"error": "解析 RSS XML 失敗", "details": str(e)}, 500)
     except Exception as e:
-        print(f"伺服器代理獲取警報時發生未知錯誤: {e}")
-        return jsonify({"error": "伺服器內部錯誤", "details": str(e)}), 500
+        logger.exception("伺服器代理獲取警報時發生未知錯誤: %s", e)
+        return json_response({"error": "伺服器內部錯誤", "details": str(e)}, 500)
+
+def _parse_coordinates_slow(coord_strs):
+    """逐一解析座標組，回傳 (緯度, 經度) 的列表並跳過格式不正確的座標。只在向量化解析失敗時使用。"""
+    points = []
+    for coord_str in coord_strs:
+        try:
+            # 分割經度、緯度、海拔
+            parts = coord_str.split(',')
+            if len(parts) >= 2: # 確保至少有經緯度
+                lon = float(parts[0]) 
+                lat = float(parts[1])
+                points.append((lat, lon)) # Leaflet 期望 latitude,longitude
+            else:
+                logger.debug("Skipping malformed coordinate part (not enough parts): %r", coord_str)
+        except ValueError:
+            logger.debug("Skipping invalid coordinate part (parsing error): %r", coord_str)
+            continue # 跳過格式不正確的座標
+    return points
+
+
+def _parse_coordinates(coords_text):
+    """
+    解析 KML 的 coordinates 文字 (以空格分隔的 longitude,latitude[,altitude] 座標組)，
+    回傳形狀為 (N, 2) 的 numpy 陣列，每列為 [緯度, 經度] (Leaflet 期望的順序)。
+    一般情況下用 numpy.fromstring 一次轉換全部數值；若座標組欄位數不一致或含有無法解析的數值，
+    則退回逐一解析，跳過格式不正確的座標。
+    """
+    coord_strs = coords_text.split(' ')
+    separators = coord_strs[0].count(',')
+    width = separators + 1 # 每個座標組的欄位數 (經度,緯度[,海拔])
+    if width >= 2 and all(coord_str.count(',') == separators for coord_str in coord_strs):
+        try:
+            values = np.fromstring(coords_text.replace(',', ' '), dtype=np.float64, sep=' ')
+        except ValueError:
+            values = None
+        if values is not None and values.size == len(coord_strs) * width:
+            # 取出 (經度, 緯度) 並交換為 (緯度, 經度)；orjson 只能直接序列化 C-contiguous 的陣列
+            return np.ascontiguousarray(values.reshape(-1, width)[:, [1, 0]])
+    return np.array(_parse_coordinates_slow(coord_strs), dtype=np.float64).reshape(-1, 2)
+
+
+def _parse_placemark(placemark, index):
+    """
+    從單一 Placemark 元素提取路徑名稱與 LineString 座標。
+    找不到有效座標時回傳 None。
+    """
+    name_element = placemark.find(KML_NAME_TAG)
+    name = name_element.text if name_element is not None else f"未知路徑 {index}"
+
+    line_string_element = placemark.find(KML_LINESTRING_TAG)
+    if line_string_element is None:
+        logger.debug("Placemark %d (%s): no LineString element.", index, name)
+        return None
+
+    coordinates_element = line_string_element.find(KML_COORDINATES_TAG)
+    if coordinates_element is None or not coordinates_element.text:
+        logger.debug("Placemark %d (%s): no coordinates element or text.", index, name)
+        return None
 
-def parse_kml_data(kml_text):
+    coords_text = coordinates_element.text.strip()
+    # 移除多餘的空白字符，確保每個座標組都正確分割
+    coords_text = ' '.join(coords_text.split()) 
+    points = np.round(_parse_coordinates(coords_text), KML_COORDINATE_DECIMALS)
+
+    if len(points) == 0:
+        logger.debug("Placemark %d (%s): no valid points parsed.", index, name)
+        return None
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Placemark %d (%s): parsed %d points.", index, name, len(points))
+    return {
+        "name": name,
+        "path": points
+    }
+
+
+def _path_points(path):
+    """將 (N, 2) 的 [緯度, 經度] 陣列轉為前端使用的 [{"lat": ..., "lon": ...}, ...] 格式。"""
+    return [{"lat": lat, "lon": lon} for lat, lon in path.tolist()]
+
+
+class KMLFormatError(ValueError):
+    """上游回應的內容不是 KML。"""
+
+
+def parse_kml_data(kml_source):
     """
     解析 KML 數據，提取颱風路徑資訊。
     預期 KML 包含多個 Placemark，每個 Placemark 可能代表一個預測模型路徑。
+    kml_source 可以是原始位元組 (例如 response.content)，或逐段產生位元組的可迭代物件
+    (例如 response.iter_content())，讓 lxml 依 XML 宣告處理編碼，並在下載的同時開始解析。
+    每個 Placemark 處理完立即釋放元素，記憶體用量不會隨 KML 大小成長。
+    回傳 [{"name": 路徑名稱, "path": (N, 2) 的 [緯度, 經度] numpy 陣列}, ...]，座標四捨五入到 KML_COORDINATE_DECIMALS 位小數。
+    內容不是 KML (例如 HTML 錯誤頁面) 時拋出 KMLFormatError。
     """
-    print("Parsing KML data...")
-    try:
-        root = ET.fromstring(kml_text)
-    except ET.ParseError as e:
-        print(f"Error parsing KML XML: {e}")
-        return None
-    
-    # KML 命名空間
-    ns = {'kml': 'http://www.opengis.net/kml/2.2'}
-    
+    if isinstance(kml_source, bytes):
+        kml_source = (kml_source,)
+
     typhoon_paths = []
+    placemark_count = 0
+
+    # 只在 Placemark 結束標籤時取得事件；recover=True 讓 lxml 盡量容忍格式稍有錯誤的 KML
+    parser = ET.XMLPullParser(
+        events=('end',), tag=KML_PLACEMARK_TAG,
+        recover=True, **SAFE_XML_PARSER_OPTIONS,
+    )
+
+    def handle_events():
+        nonlocal placemark_count
+        for _, placemark in parser.read_events():
+            placemark_count += 1
+            path = _parse_placemark(placemark, placemark_count)
+            if path is not None:
+                typhoon_paths.append(path)
 
-    # 遍歷所有的 Placemark
-    placemarks = root.findall('.//kml:Placemark', ns)
-    print(f"Found {len(placemarks)} Placemark elements in KML.")
+            # 釋放已處理的 Placemark 以及之前的兄弟節點，避免整棵樹留在記憶體中
+            placemark.clear()
+            while placemark.getprevious() is not None:
+                del placemark.getparent()[0]
 
-    if not placemarks:
-        print("No Placemark elements found in the KML. This might mean no active typhoon data.")
+    for chunk in kml_source:
+        parser.feed(chunk)
+        handle_events()
+    root = parser.close()
+    handle_events()
+    # recover=True 時 HTML 錯誤頁面或非 XML 內容也不會拋出 XMLSyntaxError，必須確認根元素是 <kml>
+    if root is None or ET.QName(root).localname != 'kml':
+        raise KMLFormatError(f"KML 的根元素不是 <kml>: {None if root is None else root.tag}")
+
+    if placemark_count == 0:
+        logger.info("No Placemark elements found in the KML. This might mean no active typhoon data.")
         return [] # 返回空列表，表示沒有找到路徑
 
-    for i, placemark in enumerate(placemarks):
-        print(f"Processing Placemark {i+1}...")
-        name_element = placemark.find('kml:name', ns)
-        name = name_element.text if name_element is not None else f"未知路徑 {i+1}"
-        print(f"  Placemark Name: {name}")
-        
-        line_string_element = placemark.find('kml:LineString', ns)
-        if line_string_element is not None:
-            print(f"  Found LineString for {name}.")
-            coordinates_element = line_string_element.find('kml:coordinates', ns)
-            if coordinates_element is not None and coordinates_element.text:
-                coords_text = coordinates_element.text.strip()
-                # 移除多餘的空白字符，確保每個座標組都正確分割
-                coords_text = ' '.join(coords_text.split()) 
-                print(f"  Raw coordinates text: '{coords_text[:100]}...' (truncated)") # Log first 100 chars
-                points = []
-                # KML 座標格式是 longitude,latitude,altitude，以空格分隔
-                for coord_str in coords_text.split(' '):
-                    try:
-                        # 分割經度、緯度、海拔
-                        parts = coord_str.split(',')
-                        if len(parts) >= 2: # 確保至少有經緯度
-                            lon = float(parts[0]) 
-                            lat = float(parts[1])
-                            points.append({"lat": lat, "lon": lon}) # Leaflet 期望 latitude,longitude
-                        else:
-                            print(f"    Skipping malformed coordinate part (not enough parts): '{coord_str}'")
-                    except ValueError:
-                        print(f"    Skipping invalid coordinate part (parsing error): '{coord_str}'")
-                        continue # 跳過格式不正確的座標
-                
-                if points:
-                    print(f"  Successfully parsed {len(points)} points for {name}.")
-                    typhoon_paths.append({
-                        "name": name,
-                        "path": points
-                    })
-                else:
-                    print(f"  No valid points parsed for {name}.")
-            else:
-                print(f"  No coordinates element or text found for {name}.")
-        else:
-            print(f"  No LineString element found for {name}.")
-    
-    print(f"Total typhoon paths extracted: {len(typhoon_paths)}")
+    logger.info("Parsed %d paths from KML (%d placemarks)", len(typhoon_paths), placemark_count)
     return typhoon_paths
 
 
 @app.route('/get-international-typhoon-data', methods=['GET'])
+@cached(policy='long', query_params=('format',))
 def get_international_typhoon_data():
     """
     這個端點將從您 GitHub 倉庫中的 KML 檔案獲取數據，並解析 KML 數據。
+    預設每個路徑點為 {"lat": ..., "lon": ...}；加上 ?format=compact 時改為 [緯度, 經度]，
+    回應較小，且可以直接由 numpy 陣列序列化。
     """
-    print("Received request for /get-international-typhoon-data (KML from GitHub)")
+    logger.debug("Received request for /get-international-typhoon-data (KML from GitHub)")
 
     try:
         # 1. 從您自己的 GitHub 倉庫下載 KML 檔案
-        print(f"Attempting to fetch KML from GitHub: {NSTC_OPENDATA_KML_URL}")
+        logger.debug("Attempting to fetch KML from GitHub: %s", NSTC_OPENDATA_KML_URL)
         # 從 GitHub raw 檔案獲取數據是安全的，不需要禁用 SSL 驗證 (verify=True 是預設值)
-        kml_response = requests.get(NSTC_OPENDATA_KML_URL, timeout=15) 
-        kml_response.raise_for_status() # 檢查 HTTP 錯誤
-        print(f"Successfully fetched KML from GitHub. Status: {kml_response.status_code}")
-        
-        kml_data = kml_response.text
-        
-        if not kml_data.strip():
-            print(f"從 {NSTC_OPENDATA_KML_URL} 獲取的 KML 數據為空。")
-            return jsonify({"success": False, "message": "從 GitHub 獲取到 KML 數據，但內容為空。"}), 200
+        # stream=True：不先把整個 KML 讀進記憶體，而是邊下載 (並解壓縮) 邊交給解析器
+        with fetch_upstream(NSTC_OPENDATA_KML_URL, stream=True) as kml_response: # HTTP 錯誤時拋出 HTTPError
+            if kml_response.status_code == 304:
+                # KML 未變更，沿用上次解析的結果，不需要重新下載與解析
+                logger.debug("KML 未變更 (HTTP 304)，沿用上次解析的結果。")
+                typhoon_paths = _cached_upstream_result(NSTC_OPENDATA_KML_URL)
+            else:
+                logger.debug("Successfully fetched KML from GitHub. Status: %d", kml_response.status_code)
+
+                # 相同 ETag 的 KML 已經解析過時，直接沿用結果，不需要讀取內容
+                cache_key = kml_response.headers.get('ETag')
+                typhoon_paths = _parsed_kml_get(cache_key) if cache_key else None
+                if typhoon_paths is not None:
+                    logger.debug("KML 內容與先前相同 (ETag 相同)，沿用已解析的結果。")
+                else:
+                    kml_chunks = kml_response.iter_content(chunk_size=KML_CHUNK_SIZE)
+                    first_chunk = next(kml_chunks, b'')
+
+                    if not first_chunk.strip():
+                        # 空白的 200 回應視為上游異常 (502)，由 cached 裝飾器改回傳舊資料
+                        logger.warning("從 %s 獲取的 KML 數據為空。", NSTC_OPENDATA_KML_URL)
+                        return json_response({"success": False, "message": "從 GitHub 獲取到 KML 數據，但內容為空。"}, 502)
+
+                    kml_source = itertools.chain((first_chunk,), kml_chunks)
+                    if cache_key is None:
+                        # 上游沒有提供 ETag 時，改以內容的 SHA-256 作為快取鍵 (需要先讀完整個 KML)
+                        kml_source = b''.join(kml_source)
+                        cache_key = hashlib.sha256(kml_source).hexdigest()
+                        typhoon_paths = _parsed_kml_get(cache_key)
+                        if typhoon_paths is not None:
+                            logger.debug("KML 內容與先前相同 (SHA-256 相同)，沿用已解析的結果。")
 
-        # 2. 解析 KML 數據
-        typhoon_paths = parse_kml_data(kml_data)
+                    if typhoon_paths is None:
+                        # 2. 解析 KML 數據
+                        typhoon_paths = parse_kml_data(kml_source)
+                        _parsed_kml_put(cache_key, typhoon_paths)
+
+                _remember_upstream_result(NSTC_OPENDATA_KML_URL, kml_response, typhoon_paths)
         
         if typhoon_paths:
-            print(f"成功從 {NSTC_OPENDATA_KML_URL} 獲取並解析國際颱風數據。")
+            logger.debug("成功從 %s 獲取並解析國際颱風數據。", NSTC_OPENDATA_KML_URL)
             # 注意：這裡將返回一個包含多個颱風路徑的列表
-            return jsonify({"success": True, "typhoonPaths": typhoon_paths})
+            if request.args.get('format') != 'compact':
+                typhoon_paths = [{"name": path["name"], "path": _path_points(path["path"])} for path in typhoon_paths]
+            return json_response({"success": True, "typhoonPaths": typhoon_paths})
         else:
-            print("從獲取的 KML 數據中未找到任何颱風路徑資訊。")
-            return jsonify({"success": False, "message": "從 GitHub 獲取到 KML 數據，但未找到任何颱風路徑資訊。"}), 200
+            logger.info("從獲取的 KML 數據中未找到任何颱風路徑資訊。")
+            response = json_response({"success": False, "message": "從 GitHub 獲取到 KML 數據，但未找到任何颱風路徑資訊。"}, 200)
+            response.headers['Cache-Control'] = 'no-store' # 不寫入快取，避免蓋掉上一份正確的颱風路徑
+            return response
 
+    except CircuitOpenError as e:
+        logger.warning("GitHub KML 斷路器開啟中，暫停請求: %s", e)
+        return json_response({"success": False, "error": "國際颱風數據來源暫時無法使用，請稍後再試。"}, 503)
     except requests.exceptions.Timeout:
-        print(f"獲取 KML 數據超時。")
-        return jsonify({"success": False, "error": "獲取國際颱風數據超時，請稍後再試。"}), 504
+        logger.error("獲取 KML 數據超時。")
+        return json_response({"success": False, "error": "獲取國際颱風數據超時，請稍後再試。"}, 504)
     except requests.exceptions.RequestException as e:
-        print(f"從 GitHub 獲取 KML 數據失敗: {e}")
+        logger.error("從 GitHub 獲取 KML 數據失敗: %s", e)
         # 這裡的錯誤應該是因為 KML 檔案不存在或無法從 GitHub 獲取，而不是 SSL 錯誤
         # 如果 KML 檔案還沒被 GitHub Actions 推送，這裡就會報 404
-        return jsonify({"success": False, "error": f"無法從 GitHub 獲取國際颱風數據: {str(e)}"}), 500
-    except ET.ParseError as e:
-        print(f"解析 KML 數據失敗: {e}. 原始 KML 開頭: {kml_data[:500] if 'kml_data' in locals() else 'N/A'}")
-        return jsonify({"success": False, "error": f"解析國際颱風 KML 數據失敗: {str(e)}"}), 500
+        return json_response({"success": False, "error": f"無法從 GitHub 獲取國際颱風數據: {str(e)}"}, 500)
+    except (ET.XMLSyntaxError, KMLFormatError) as e:
+        logger.error("解析 KML 數據失敗: %s", e)
+        return json_response({"success": False, "error": f"解析國際颱風 KML 數據失敗: {str(e)}"}, 500)
     except Exception as e:
-        print(f"處理國際颱風數據時發生未知錯誤: {e}")
-        return jsonify({"success": False, "error": f"處理國際颱風數據時發生未知錯誤: {str(e)}"}), 500
+        logger.exception("處理國際颱風數據時發生未知錯誤: %s", e)
+        return json_response({"success": False, "error": f"處理國際颱風數據時發生未知錯誤: {str(e)}"}, 500)
+
+
+# /get-all 合併的端點：(回應中的欄位名稱, 路由路徑)
+COMBINED_ROUTES = (
+    ('typhoon', '/get-typhoon-data'),
+    ('warnings', '/get-cwa-warnings'),
+    ('international', '/get-international-typhoon-data'),
+)
+
+
+def _render_route(path):
+    """在獨立的請求情境中執行指定路由 (包含其快取)，回傳 Flask 回應物件。"""
+    with app.test_request_context(path):
+        return app.make_response(app.dispatch_request())
+
+
+@app.route('/get-all', methods=['GET'])
+def get_all_data():
+    """
+    一次取得颱風資料、警報特報與國際颱風路徑。
+    三個端點同時執行，總等待時間約等於最慢的一個上游，而不是三者相加。
+    每個欄位的內容與對應端點的回應相同，並各自使用該端點的快取。
+    每個請求使用自己的小型執行緒池 (以 gevent 執行時為協程)，不會因共用固定大小的池而互相排隊。
+    """
+    logger.debug("Received request for /get-all")
+    with ThreadPoolExecutor(max_workers=len(COMBINED_ROUTES), thread_name_prefix='route') as executor:
+        futures = [(name, executor.submit(_render_route, path)) for name, path in COMBINED_ROUTES]
+
+        # 各端點的回應已經是 JSON 位元組，直接組合成一個 JSON 物件，不需要重新序列化。
+        # 颱風資料會原樣轉送上游的內容，因此每個部分仍以 orjson 驗證；無效的部分改為錯誤物件，不會讓整份回應失效
+        parts = []
+        for name, future in futures:
+            response = future.result()
+            data = response.get_data()
+            try:
+                orjson.loads(data)
+            except orjson.JSONDecodeError as e:
+                logger.error("/get-all 的 %s 不是有效的 JSON: %s", name, e)
+                data = orjson.dumps({"error": "回應內容不是有效的 JSON", "status": response.status_code})
+            parts.append(orjson.dumps(name) + b':' + data)
+    return app.response_class(b'{' + b','.join(parts) + b'}', mimetype='application/json')
+
+
+# 背景預先更新 COMBINED_ROUTES 各端點快取的間隔秒數，使用者請求一律命中快取，不需要等待上游；
+# 0 表示停用 (例如 Vercel 這類沒有常駐行程的環境)
+REFRESH_INTERVAL = int(os.environ.get('REFRESH_INTERVAL', '0'))
+# 各端點最近一次背景更新的狀態，供 /healthz 回報：{路由路徑: {'refreshed_at': ..., 'status': ...}}
+REFRESH_STATE = {path: {'refreshed_at': None, 'status': None} for _, path in COMBINED_ROUTES}
+REFRESH_LOCK = threading.Lock()
+
+
+def refresh_route(path):
+    """
+    重新產生指定端點的回應 (不經過快取)，成功時寫入該端點的快取。
+    寫入的新鮮期限至少是更新間隔的兩倍，下一次背景更新前快取不會過期。
+    """
+    with app.test_request_context(path):
+        view = app.view_functions[request.endpoint]
+        response = app.make_response(view.__wrapped__())
+        if _is_cacheable(response):
+            response.last_modified = time.time()
+            _cache_store(_cache_key(view.cache_query_params), response, max(view.cache_ttl, 2 * REFRESH_INTERVAL))
+    with REFRESH_LOCK:
+        REFRESH_STATE[path]['status'] = response.status_code
+        if response.status_code == 200:
+            REFRESH_STATE[path]['refreshed_at'] = time.time()
+    return response
+
+
+def _refresh_loop():
+    while True:
+        for _, path in COMBINED_ROUTES:
+            try:
+                refresh_route(path)
+            except Exception:
+                logger.exception("背景更新 %s 失敗", path)
+        time.sleep(REFRESH_INTERVAL)
+
+
+def start_refresher():
+    """啟動背景更新各端點快取的常駐執行緒 (以 gevent 執行時為協程)。"""
+    thread = threading.Thread(target=_refresh_loop, name='cache-refresher', daemon=True)
+    thread.start()
+    return thread
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """健康檢查端點，回報背景更新是否啟用，以及各端點距離上次成功更新的秒數。"""
+    now = time.time()
+    with REFRESH_LOCK:
+        routes = {
+            path: {
+                "lastStatus": state['status'],
+                "lastRefreshAgeSeconds": round(now - state['refreshed_at'], 1) if state['refreshed_at'] is not None else None,
+            }
+            for path, state in REFRESH_STATE.items()
+        }
+    response = json_response({
+        "status": "ok",
+        "refresh": {
+            "enabled": REFRESH_INTERVAL > 0,
+            "intervalSeconds": REFRESH_INTERVAL,
+            "routes": routes,
+        },
+    })
+    response.headers['Cache-Control'] = 'no-store' # 健康檢查必須反映當下狀態，不可被瀏覽器或 CDN 快取
+    return response
+
+
+if REFRESH_INTERVAL > 0:
+    start_refresher()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,12 @@
+# gunicorn 設定檔：使用 gevent worker 執行 wsgi:app
+# gunicorn -c gunicorn.conf.py wsgi:app
+import os
+
+worker_class = 'gevent'
+workers = int(os.environ.get('GUNICORN_WORKERS', '2'))
+# 每個 worker 可同時處理的連線 (協程) 數量
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:' + os.environ.get('PORT', '5000'))
+
+# 讓 api.py 中 SESSION 的連線池大小不小於 worker_connections，避免同時請求時連線被丟棄重建
+os.environ.setdefault('UPSTREAM_POOL_MAXSIZE', str(worker_connections))
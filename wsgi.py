@@ -0,0 +1,20 @@
+# 正式環境的 WSGI 進入點，以 gevent 協程讓單一進程同時處理大量代理請求。
+# 上游請求幾乎都在等待網路 I/O，monkey.patch_all() 會讓阻塞的 socket 操作自動讓出給其他協程。
+# 啟動方式 (設定值見 gunicorn.conf.py)：
+# gunicorn -c gunicorn.conf.py wsgi:app
+# 不使用 gunicorn 時也可以直接執行 python wsgi.py，以 gevent 內建的 WSGIServer 提供服務。
+
+# monkey.patch_all() 必須在匯入 requests (也就是 api 模組) 之前執行
+from gevent import monkey
+monkey.patch_all()
+
+import os # noqa: E402
+
+from api import app # noqa: E402
+
+
+if __name__ == '__main__':
+    from gevent.pywsgi import WSGIServer
+
+    port = int(os.environ.get('PORT', '5000'))
+    WSGIServer(('0.0.0.0', port), app).serve_forever()